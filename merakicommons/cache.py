@@ -1,33 +1,58 @@
 from functools import wraps
-from typing import Callable, Any, TypeVar
-from threading import Lock
-from collections import defaultdict
-import datetime
+from typing import Callable, Any, TypeVar, Tuple, Optional
+from threading import Lock, RLock
+from collections import OrderedDict
+from time import monotonic
+from math import inf
 
 T = TypeVar("T")
 
+_MISSING = object()
+
 
 def lazy(method: Callable[[Any], T]) -> Callable[[Any], T]:
+    # The memoized value lives directly on the instance, so it is reclaimed with the object and a hit is one attribute read.
+    # It's read with getattr rather than through __dict__, so it also works on classes that declare it in __slots__.
+    name = "_lazy__{}".format(method.__name__)
+
+    # Locks for instances whose value is being computed right now, keyed by id(instance). They're dropped once the value is stored, so nothing unpicklable is left on the instance.
+    locks = {}
+    locks_lock = Lock()
+
     @wraps(method)
     def wrapper(self) -> T:
-        s = "_lazy__{}".format(method.__name__)
-        try:
-            return getattr(self, s)
-        except AttributeError:
-            value = method(self)
-            setattr(self, s, value)
+        value = getattr(self, name, _MISSING)
+        if value is not _MISSING:
             return value
 
+        # Only one thread computes the value for a given instance. Everyone else waits for it and reuses the result.
+        # The lock is reentrant, so a method that reaches itself again recurses until RecursionError instead of deadlocking.
+        key = id(self)
+        with locks_lock:
+            lock = locks.get(key)
+            if lock is None:
+                lock = locks[key] = RLock()
+        with lock:
+            try:
+                value = getattr(self, name, _MISSING)
+                if value is _MISSING:
+                    value = method(self)
+                    setattr(self, name, value)
+                return value
+            finally:
+                # self is alive for this whole call, so its id can't have been reused by another instance yet
+                with locks_lock:
+                    if locks.get(key) is lock:
+                        del locks[key]
+
     def _lazy_reset(self) -> None:
-        s = "_lazy__{}".format(method.__name__)
         try:
-            delattr(self, s)
-        except KeyError:
+            delattr(self, name)
+        except AttributeError:
             pass
 
     def _lazy_set(self, value) -> None:
-        s = "_lazy__{}".format(method.__name__)
-        setattr(self, s, value)
+        setattr(self, name, value)
 
     wrapper._lazy_reset = _lazy_reset
     wrapper._lazy_set = _lazy_set
@@ -40,60 +65,139 @@ def lazy_property(method: Callable[[Any], T]) -> property:
 
 
 class _CacheSegment(object):
-    def __init__(self) -> None:
-        self._data = defaultdict(dict)
-        self._lock = Lock()
-
-    def put(self, type: Any, key: Any, value: Any, timeout: int = -1) -> None:
+    __slots__ = ("_shard_count", "_data", "_bounds", "_meta_lock")
+
+    def __init__(self, shards: int = 16) -> None:
+        if shards < 1 or shards & (shards - 1):
+            raise ValueError("Shard count must be a positive power of two!")
+        self._shard_count = shards
+        self._data = {}
+        self._bounds = {}
+        self._meta_lock = Lock()
+
+    def _get_or_create_shards(self, type: Any) -> Tuple[Tuple[Lock, OrderedDict], ...]:
+        with self._meta_lock:
+            try:
+                return self._data[type]
+            except KeyError:
+                # A bounded type keeps a single shard so its LRU order and size are exact
+                count = 1 if type in self._bounds else self._shard_count
+                shards = tuple((Lock(), OrderedDict()) for _ in range(count))
+                self._data[type] = shards
+                return shards
+
+    def _set_bound(self, type: Any, maxsize: int) -> None:
+        with self._meta_lock:
+            self._bounds[type] = maxsize
+            shards = self._data.get(type)
+            if shards is None or len(shards) == 1:
+                return
+            # The type already holds unbounded entries, so merge its shards into one
+            for lock, _ in shards:
+                lock.acquire()
+            try:
+                merged = OrderedDict()
+                for _, bucket in shards:
+                    merged.update(bucket)
+                while len(merged) > maxsize:
+                    merged.popitem(last=False)
+                self._data[type] = ((Lock(), merged),)
+            finally:
+                for lock, _ in shards:
+                    lock.release()
+
+    def _lock_shard(self, type: Any, shards: Tuple[Tuple[Lock, OrderedDict], ...], key: Any) -> Tuple[Lock, OrderedDict]:
+        # Returns the key's shard with its lock held. Setting a bound can replace a type's shards while we wait on the lock, in which case we retry on the new ones.
+        while True:
+            lock, bucket = shards[hash(key) & (len(shards) - 1)]
+            lock.acquire()
+            current = self._data[type]
+            if current is shards:
+                return lock, bucket
+            lock.release()
+            shards = current
+
+    def put(self, type: Any, key: Any, value: Any, timeout: int = -1, maxsize: Optional[int] = None) -> None:
+        if maxsize is not None:
+            if maxsize < 1:
+                raise ValueError("Max size must be >= 1!")
+            if self._bounds.get(type) != maxsize:
+                self._set_bound(type, maxsize)
         if timeout != 0:
-            with self._lock:
-                if timeout != -1:
-                    timeout = datetime.timedelta(seconds=timeout)
-                self._data[type][key] = (value, timeout, datetime.datetime.now())
+            expire_at = inf if timeout == -1 else monotonic() + timeout
+            shards = self._data.get(type) or self._get_or_create_shards(type)
+            lock, bucket = self._lock_shard(type, shards, key)
+            try:
+                bucket[key] = (value, expire_at)
+                bucket.move_to_end(key)
+                bound = self._bounds.get(type)
+                if bound is not None:
+                    while len(bucket) > bound:
+                        bucket.popitem(last=False)
+            finally:
+                lock.release()
 
     def get(self, type: Any, key: Any) -> Any:
-        with self._lock:
-            item, timeout, entered = self._data[type][key]
-            if timeout == -1:
-                return item
-            now = datetime.datetime.now()
-            if now > entered + timeout:
-                self._data[type].pop(key)
-                raise KeyError
-            else:
-                return item
+        # Reads never create shards for a type, so probing for types that were never stored doesn't grow the cache
+        shards = self._data.get(type)
+        if shards is None:
+            raise KeyError(key)
+        lock, bucket = self._lock_shard(type, shards, key)
+        try:
+            item, expire_at = bucket[key]
+            if monotonic() > expire_at:
+                bucket.pop(key)
+                raise KeyError(key)
+            bucket.move_to_end(key)
+            return item
+        finally:
+            lock.release()
 
     def get_all(self, type: Any):
-        with self._lock:
-            results = []
-            for key, (item, timeout, entered) in self._data[type].items():
-                if timeout == -1:
-                    results.append(item)
-                now = datetime.datetime.now()
-                if now > entered + timeout:
-                    self._data[type].pop(key)
-                else:
-                    results.append(item)
+        results = []
+        for lock, bucket in self._data.get(type, ()):
+            with lock:
+                now = monotonic()
+                for key, (item, expire_at) in list(bucket.items()):
+                    if now > expire_at:
+                        bucket.pop(key)
+                    else:
+                        results.append(item)
         return results
 
     def delete(self, type: Any, key: Any) -> None:
-        with self._lock:
-            del self._data[type][key]
+        shards = self._data.get(type)
+        if shards is None:
+            raise KeyError(key)
+        lock, bucket = self._lock_shard(type, shards, key)
+        try:
+            del bucket[key]
+        finally:
+            lock.release()
 
     def contains(self, type: Any, key: Any) -> bool:
-        with self._lock:
-            return self._data[type].__contains__(key)
+        shards = self._data.get(type)
+        if shards is None:
+            return False
+        lock, bucket = shards[hash(key) & (len(shards) - 1)]
+        with lock:
+            return key in bucket
 
     def expire(self, type: Any = None):
         if type is None:
-            types = set(self._data.keys())
+            with self._meta_lock:
+                types = set(self._data.keys())
         else:
             types = {type}
         for type in types:
-            for key in self._data[type]:
-                self.get(type, key)
+            for lock, bucket in self._data.get(type, ()):
+                with lock:
+                    now = monotonic()
+                    expired = [key for key, (_, expire_at) in bucket.items() if now > expire_at]
+                    for key in expired:
+                        del bucket[key]
 
 
 # TODO: In development. Interface here for beginning integration.
 class Cache(_CacheSegment):
-    pass
+    __slots__ = ()
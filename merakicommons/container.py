@@ -1,41 +1,75 @@
+from operator import attrgetter
+from types import MappingProxyType
 from typing import Type, TypeVar, Mapping, Callable, Union, Iterable, Any, Generator, Tuple, Optional
 
 T = TypeVar("T")
 
+_MISSING = object()
+
 
 class SearchError(TypeError):
     pass
 
 
+# type -> whether `item in x` can work for instances of that type. The set of element types seen is small, and a failed
+# hasattr is expensive, so each type is only inspected once.
+_SUPPORTS_IN_CACHE = {}
+
+
+def _supports_in(x: Any) -> bool:
+    """Whether `item in x` can work at all. Checking the type is far cheaper than raising and catching a TypeError."""
+    x_type = type(x)
+    supported = _SUPPORTS_IN_CACHE.get(x_type)
+    if supported is None:
+        # The `in` operator falls back to iteration and then indexing when __contains__ isn't defined
+        supported = hasattr(x_type, "__contains__") or hasattr(x_type, "__iter__") or hasattr(x_type, "__getitem__")
+        _SUPPORTS_IN_CACHE[x_type] = supported
+    return supported
+
+
+def _is_index(item: Any) -> bool:
+    """Whether list indexing accepts item (ints, slices and anything else implementing __index__)."""
+    return isinstance(item, slice) or hasattr(type(item), "__index__")
+
+
+def _matches(x: Any, item: Any) -> bool:
+    """Whether x equals item or finds it with `in`, i.e. whether x is a search hit for item.
+
+    The searchable containers' find() and contains() scan with this inline rather than through their enumerate(), which
+    would cost a generator per call for a single result.
+    """
+    if x == item:
+        return True
+    if _supports_in(x):
+        try:
+            return item in x
+        except TypeError:
+            # x can't search for this type of item
+            pass
+    return False
+
+
 def searchable(search_key_types: Mapping[Type, Union[str, Iterable[str]]]) -> Callable[[T], T]:
-    search_key_types = dict(search_key_types)
+    search_table = {}
 
     # For each key type, we want to store the ordered attributes to query.
-    # We accept attribute.sub_attribute, so split all target attributes on "."
+    # attrgetter walks attribute.sub_attribute chains for us, so compile one per target attribute up front.
     for key, types in search_key_types.items():
         if isinstance(types, str):
             types = [types]
-        types = [type.split(".") for type in types]
-        search_key_types[key] = types
+        search_table[key] = tuple(attrgetter(type) for type in types)
 
-    def search(instance: T, item: Any) -> bool:
-        try:
-            search_keys = search_key_types[type(item)]
-        except KeyError:
-            raise SearchError("Attempted to search for invalid type! Accepted types are {types}".format(types=[key_type.__name__ for key_type in search_key_types.keys()]))
-
-        for search_key in search_keys:
-            failed = False
-            value = instance
-            for sub_attribute in search_key:
-                try:
-                    value = getattr(value, sub_attribute)
-                except AttributeError:
-                    failed = True
-                    break
+    # The table never changes after decoration, so expose it read-only
+    search_key_types = MappingProxyType(search_table)
+    accepted_types = [key_type.__name__ for key_type in search_key_types.keys()]
+    invalid_type_message = "Attempted to search for invalid type! Accepted types are {types}".format(types=accepted_types)
 
-            # This search key didn't exist for the item
-            if failed:
+    def search_attributes(instance: T, item: Any, getters: Tuple[Callable[[T], Any], ...]) -> bool:
+        for getter in getters:
+            try:
+                value = getter(instance)
+            except AttributeError:
+                # This search key didn't exist for the item
                 continue
 
             # Found the search item directly as an attribute
@@ -49,6 +83,13 @@ def searchable(search_key_types: Mapping[Type, Union[str, Iterable[str]]]) -> Ca
             except (TypeError, SearchError):
                 # The attribute doesn't define __contains__ or is searchable and doesn't accept this key type
                 continue
+        return False
+
+    def search(instance: T, item: Any) -> bool:
+        getters = search_key_types.get(type(item))
+        if getters is None:
+            raise SearchError(invalid_type_message)
+        return search_attributes(instance, item, getters)
 
     def decorator(cls: T) -> T:
         if hasattr(cls, "__contains__"):
@@ -60,16 +101,14 @@ def searchable(search_key_types: Mapping[Type, Union[str, Iterable[str]]]) -> Ca
                 # If it's contained by normal means, short circuit
                 if result:
                     return True
-                try:
-                    # Try a search
-                    if search(self, item):
-                        return True
-                except SearchError:
-                    # Search doesn't accept that type
-                    pass
 
-                # Search and normal __contains__ implementations both were False
-                return False
+                # Search doesn't accept that type. Check directly rather than raising and catching a SearchError on every miss.
+                getters = search_key_types.get(type(item))
+                if getters is None:
+                    return False
+
+                # Try a search
+                return search_attributes(self, item, getters)
         else:
             new_contains = search
 
@@ -79,32 +118,141 @@ def searchable(search_key_types: Mapping[Type, Union[str, Iterable[str]]]) -> Ca
             cls.__doc__ += "\n\n"
         else:
             cls.__doc__ = ""
-        cls.__doc__ += "Searchable by {types}".format(types=[key_type.__name__ for key_type in search_key_types.keys()])
+        cls.__doc__ += "Searchable by {types}".format(types=accepted_types)
 
         return cls
 
     return decorator
 
 
-class SearchableList(list):
+class _ValueIndex(object):
+    """Counts of a container's hashable values, so plain equality membership doesn't need a linear scan.
+
+    The index is built on the first contains() and kept up to date by single-value mutations. Bulk mutations just drop it.
+    Subclasses list the values to count in `_index_values`.
+    """
+    __slots__ = ()
+    _index = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Re-initializing replaces the contents, so any existing index no longer matches them
+        self.__dict__.pop("_index", None)
+
+    def __getstate__(self) -> dict:
+        # Copies and pickles rebuild their own index
+        state = self.__dict__.copy()
+        state.pop("_index", None)
+        return state
+
+    def _index_values(self) -> Iterable:
+        raise NotImplementedError
+
+    def _build_index(self) -> dict:
+        index = {}
+        for value in self._index_values():
+            try:
+                index[value] = index.get(value, 0) + 1
+            except TypeError:
+                # Unhashable values are only found by scanning
+                pass
+        self._index = index
+        return index
+
+    def _index_add(self, value: Any) -> None:
+        index = self._index
+        if index is not None:
+            try:
+                index[value] = index.get(value, 0) + 1
+            except TypeError:
+                pass
+
+    def _index_remove(self, value: Any) -> None:
+        index = self._index
+        if index is not None:
+            try:
+                count = index[value] - 1
+            except (KeyError, TypeError):
+                return
+            if count:
+                index[value] = count
+            else:
+                del index[value]
+
+
+class SearchableList(_ValueIndex, list):
+    _indexed = True
+
+    def _index_values(self) -> Iterable:
+        return list.__iter__(self)
+
     def filter(self, function):
         return SearchableList(filter(function, self))
 
     def __getitem__(self, item: Any) -> Any:
-        try:
+        if _is_index(item):
             return list.__getitem__(self, item)
-        except TypeError:
-            return self.find(item)
+        return self.find(item)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if isinstance(key, slice):
+            list.__setitem__(self, key, value)
+            self._index = None
+        else:
+            old = list.__getitem__(self, key)
+            list.__setitem__(self, key, value)
+            self._index_remove(old)
+            self._index_add(value)
 
     def __contains__(self, item: Any) -> bool:
         return self.contains(item)
 
     def __delitem__(self, item: Any) -> None:
-        try:
+        if isinstance(item, slice):
             list.__delitem__(self, item)
-        except TypeError:
+            self._index = None
+        elif _is_index(item):
+            old = list.__getitem__(self, item)
+            list.__delitem__(self, item)
+            self._index_remove(old)
+        else:
             self.delete(item)
 
+    def __iadd__(self, other: Iterable) -> "SearchableList":
+        list.extend(self, other)
+        self._index = None
+        return self
+
+    def __imul__(self, count: int) -> "SearchableList":
+        list.__imul__(self, count)
+        self._index = None
+        return self
+
+    def append(self, item: Any) -> None:
+        list.append(self, item)
+        self._index_add(item)
+
+    def extend(self, iterable: Iterable) -> None:
+        list.extend(self, iterable)
+        self._index = None
+
+    def insert(self, index: int, item: Any) -> None:
+        list.insert(self, index, item)
+        self._index_add(item)
+
+    def pop(self, index: int = -1) -> Any:
+        item = list.pop(self, index)
+        self._index_remove(item)
+        return item
+
+    def remove(self, item: Any) -> None:
+        list.remove(self, item)
+        self._index_remove(item)
+
+    def clear(self) -> None:
+        list.clear(self)
+        self._index = None
+
     def _search_generator(self, item: Any, reverse: bool = False) -> Generator[Any, None, None]:
         """A helper method for `self.search` that returns a generator rather than a list."""
         results = 0
@@ -118,45 +266,54 @@ class SearchableList(list):
         if streaming:
             return self._search_generator(item, reverse=reverse)
         else:
-            result = SearchableList(x for _, x in self.enumerate(item, reverse=reverse))
-            if len(result) == 0:
+            matches = [x for _, x in self.enumerate(item, reverse=reverse)]
+            if len(matches) == 0:
                 raise SearchError(str(item))
-            return result
+            return SearchableList(matches)
 
     def find(self, item: Any, reverse: bool = False) -> Any:
-        for _, x in self.enumerate(item, reverse=reverse):
-            return x
+        matches = _matches
+        for x in reversed(self) if reverse else self:
+            if matches(x, item):
+                return x
         raise SearchError(str(item))
 
     def contains(self, item: Any) -> bool:
-        for _, _ in self.enumerate(item):
-            return True
+        if self._indexed:
+            index = self._index
+            if index is None:
+                index = self._build_index()
+            try:
+                if item in index:
+                    return True
+            except TypeError:
+                # item is unhashable
+                pass
+
+        matches = _matches
+        for x in self:
+            if matches(x, item):
+                return True
         return False
 
     def enumerate(self, item: Any, reverse: bool = False) -> Generator[Tuple[int, Any], None, None]:
-        items = self
         if reverse:
-            max = len(items) - 1
-            items = reversed(items)
-        for index, x in enumerate(items):
-            if x == item:
-                yield max - index if reverse else index, x
-                continue
-
-            try:
-                if item in x:
-                    yield max - index if reverse else index, x
-            except TypeError:
-                # x doesn't define __contains__
-                pass
+            # Walk the real indices backwards rather than translating indices from a reversed iterator
+            indexed = zip(range(len(self) - 1, -1, -1), reversed(self))
+        else:
+            # Iterate (rather than index) going forwards so lazy subclasses only generate what is searched
+            indexed = enumerate(self)
+        matches = _matches
+        for index, x in indexed:
+            if matches(x, item):
+                yield index, x
 
     def delete(self, item: Any) -> None:
-        deleted = 0
-        for index, _ in self.enumerate(item, reverse=True):
-            del self[index]
-            deleted += 1
-        if deleted == 0:
+        # Collect every match before touching the list, then rebuild it in one pass rather than shifting it per match
+        matches = {index for index, _ in self.enumerate(item)}
+        if len(matches) == 0:
             raise SearchError(str(item))
+        self[:] = [x for index, x in enumerate(list.__iter__(self)) if index not in matches]
 
 
 class SearchableSet(set):
@@ -191,55 +348,102 @@ class SearchableSet(set):
             return result
 
     def find(self, item: Any) -> Any:
-        for x in self.enumerate(item):
-            return x
+        matches = _matches
+        for x in self:
+            if matches(x, item):
+                return x
         raise SearchError(str(item))
 
     def contains(self, item: Any) -> bool:
-        for _ in self.enumerate(item):
-            return True
+        # A hash lookup finds plain equal members without scanning. The scan still catches containment and custom __eq__ matches.
+        try:
+            if set.__contains__(self, item):
+                return True
+        except TypeError:
+            # item is unhashable
+            pass
+
+        matches = _matches
+        for x in self:
+            if matches(x, item):
+                return True
         return False
 
     def enumerate(self, item: Any) -> Generator[Any, None, None]:
+        matches = _matches
         for x in self:
-            if x == item:
+            if matches(x, item):
                 yield x
-                continue
-
-            try:
-                if item in x:
-                    yield x
-            except TypeError:
-                # x doesn't define __contains__
-                pass
 
     def delete(self, item: Any) -> None:
-        to_delete = set(self.enumerate(item))
+        # Matches are already unique, so a list is enough, and difference_update removes them all in one call
+        to_delete = list(self.enumerate(item))
         if len(to_delete) == 0:
             raise SearchError(str(item))
-        for x in to_delete:
-            self.remove(x)
+        self.difference_update(to_delete)
 
 
-class SearchableDictionary(dict):
+class SearchableDictionary(_ValueIndex, dict):
+    def _index_values(self) -> Iterable:
+        # Only values are indexed. Keys already have the dict itself.
+        return dict.values(self)
+
     def filter(self, function):
         return SearchableDictionary(filter(function, self.items()))
 
     def __getitem__(self, item: Any) -> Any:
-        try:
-            return dict.__getitem__(self, item)
-        except KeyError:
-            return self.find(item)
+        value = dict.get(self, item, _MISSING)
+        if value is not _MISSING:
+            return value
+        return self.find(item)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        old = dict.get(self, key, _MISSING)
+        dict.__setitem__(self, key, value)
+        if old is not _MISSING:
+            self._index_remove(old)
+        self._index_add(value)
 
     def __contains__(self, item: Any) -> bool:
         return self.contains(item)
 
     def __delitem__(self, item: Any) -> None:
-        try:
-            dict.__delitem__(self, item)
-        except KeyError:
+        if dict.__contains__(self, item):
+            self._index_remove(dict.pop(self, item))
+        else:
             self.delete(item)
 
+    def __ior__(self, other: Any) -> "SearchableDictionary":
+        dict.update(self, other)
+        self._index = None
+        return self
+
+    def update(self, *args, **kwargs) -> None:
+        dict.update(self, *args, **kwargs)
+        self._index = None
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        self[key] = default
+        return default
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if dict.__contains__(self, key):
+            value = dict.pop(self, key)
+            self._index_remove(value)
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self) -> Tuple[Any, Any]:
+        key, value = dict.popitem(self)
+        self._index_remove(value)
+        return key, value
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._index = None
+
     def _search_generator(self, item: Any) -> Generator[Tuple[Any, Any], None, None]:
         """A helper method for `self.search` that returns a generator rather than a list."""
         results = 0
@@ -259,65 +463,44 @@ class SearchableDictionary(dict):
             return result
 
     def find(self, item: Any) -> Tuple[Any, Any]:
-        for key, value in self.items():
-            if key == item:
+        # Resolve the per-pair predicate once instead of on every iteration
+        matches = _matches
+        for key, value in dict.items(self):
+            if matches(key, item) or matches(value, item):
                 return key, value
-
-            try:
-                if item in key:
-                    return key, value
-            except TypeError:
-                # key doesn't define __contains__
-                pass
-
-            if value == item:
-                return key, value
-
-            try:
-                if item in value:
-                    return key, value
-            except TypeError:
-                # value doesn't define __contains__
-                pass
         raise SearchError(str(item))
 
     def contains(self, item: Any) -> bool:
-        for _, _ in self.enumerate(item):
-            return True
+        # Plain key or value equality is answered by hash lookups. Only a miss on both needs the scan for `in` matches.
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        try:
+            if dict.__contains__(self, item) or item in index:
+                return True
+        except TypeError:
+            # Unhashable items can only be found by scanning
+            pass
+
+        matches = _matches
+        for key, value in dict.items(self):
+            if matches(key, item) or matches(value, item):
+                return True
         return False
 
     def enumerate(self, item: Any) -> Generator[Tuple[Any, Any], None, None]:
-        for key, value in self.items():
-            if key == item:
+        matches = _matches
+        for key, value in dict.items(self):
+            if matches(key, item) or matches(value, item):
                 yield key, value
-                continue
-
-            try:
-                if item in key:
-                    yield key, value
-                    continue
-            except TypeError:
-                # key doesn't define __contains__
-                pass
-
-            if value == item:
-                yield key, value
-                continue
-
-            try:
-                if item in value:
-                    yield key, value
-                    continue
-            except TypeError:
-                # value doesn't define __contains__
-                pass
 
     def delete(self, item: Any) -> None:
-        to_delete = {key for key, _ in self.enumerate(item)}
+        # Keys are already unique, so collect them in a list and delete them without going back through __delitem__'s search fallback
+        to_delete = [key for key, _ in self.enumerate(item)]
         if len(to_delete) == 0:
             raise SearchError(str(item))
         for key in to_delete:
-            del self[key]
+            self._index_remove(dict.pop(self, key))
 
 
 class LazyList(list):
@@ -358,10 +541,10 @@ class LazyList(list):
 
     def __len__(self):
         if self._empty:
-            return super().__len__()
+            return list.__len__(self)
         else:
             self._generate_more()
-            return super().__len__()
+            return list.__len__(self)
 
     def __next__(self):
         try:
@@ -373,40 +556,44 @@ class LazyList(list):
         return value
 
     def _generate_more(self, count: Optional[int] = None):
+        # Pull straight from the generator with the bound append held in a local, rather than going through __next__ per item
+        generator = self._generator
+        append = super().append
         if count is not None:
-            for _ in range(count):
-                next(self)
-        else:
-            for _ in self:
-                pass
-            assert self._empty
+            try:
+                for _ in range(count):
+                    append(next(generator))
+            except StopIteration as error:
+                self._empty = True
+                raise error
+        elif not self._empty:
+            for value in generator:
+                append(value)
+            self._empty = True
 
     def _create_sliced_lazy_list(self, s: slice) -> "LazyList":
-        num_already_generated = super().__len__()
-
-        def gen(start, stop, step):
-            count = start
-            while count < stop:
-                try:
-                    x = self[count]
-                    if not self._empty:
-                        yield x
-                    else:
-                        raise StopIteration
-                except SearchError:
-                    raise StopIteration
-                count += step
+        start, stop, step = s.start, s.stop, s.step
 
+        # Whatever part of the slice is already generated is copied over as known data
+        num_already_generated = list.__len__(self)
         already_known = []
-        if s.start < num_already_generated:
-            already_known_end = min(s.stop, num_already_generated)
-            already_known = self[s.start:already_known_end]
-            gen_start = already_known_end + 1
-        else:
-            gen_start = s.start
-        gen = gen(gen_start, s.stop, s.step)
-        new = LazyList(generator=gen, known_data=already_known)
-        return new
+        if start < num_already_generated:
+            already_known = list.__getitem__(self, slice(start, min(stop, num_already_generated), step))
+
+        def gen(index):
+            # Walk the underlying storage directly, pulling from the generator only when the next index isn't there yet
+            while index < stop:
+                while list.__len__(self) <= index:
+                    if self._empty:
+                        return
+                    try:
+                        next(self)
+                    except StopIteration:
+                        return
+                yield list.__getitem__(self, index)
+                index += step
+
+        return LazyList(generator=gen(start + len(already_known) * step), known_data=already_known)
 
     def __getitem__(self, item: Any) -> Any:
         """
@@ -438,9 +625,14 @@ class LazyList(list):
             if self._empty:
                 return LazyList(generator=None, known_data=list.__getitem__(self, item))
 
+            # Negative indices and steps are relative to the end, so generate all the data and apply the original slice
+            if any(index is not None and index < 0 for index in (item.start, item.stop, item.step)):
+                self._generate_more()
+                return LazyList(generator=None, known_data=list.__getitem__(self, item))
+
             # Even if we don't have all the data, we might have enough of it to return normally
-            if item.stop is not None and super().__len__() >= item.stop - 1:
-                # [:10] requires super().__len__() >= 9 = 10 - 1
+            if item.stop is not None and list.__len__(self) >= item.stop - 1:
+                # [:10] requires list.__len__(self) >= 9 = 10 - 1
                 return LazyList(generator=None, known_data=list.__getitem__(self, item))
 
             # We don't have enough data, so we need to generate the data on-the-fly as the list is iterated over
@@ -452,7 +644,7 @@ class LazyList(list):
             return list.__getitem__(self, item)
         except IndexError:
             # Generate new values until: 1) we get to position `item` (which is an int) or 2) no more values are left
-            generate_n_more = stop - super().__len__() + 1 if stop is not None else None
+            generate_n_more = stop - list.__len__(self) + 1 if stop is not None else None
             try:
                 self._generate_more(generate_n_more)
             except StopIteration:
@@ -471,7 +663,7 @@ class LazyList(list):
                 return list.__delitem__(self, item)
             except IndexError:
                 # Generate new values until: 1) we get to position `item` (which is an int) or 2) no more values are left
-                generate_n_more = stop - super().__len__() + 1 if stop is not None else None
+                generate_n_more = stop - list.__len__(self) + 1 if stop is not None else None
                 try:
                     self._generate_more(generate_n_more)
                 except StopIteration:
@@ -484,8 +676,8 @@ class LazyList(list):
                 return list.__delitem__(self, item)
 
             # Even if we don't have all the data, we might have enough of it to delete normally
-            if item.stop is not None and super().__len__() >= item.stop - 1:
-                # [:10] requires super().__len__() >= 9 = 10 - 1
+            if item.stop is not None and list.__len__(self) >= item.stop - 1:
+                # [:10] requires list.__len__(self) >= 9 = 10 - 1
                 return list.__delitem__(self, item)
 
             # We don't have enough data, so we need to generate the data on-the-fly as the list is iterated over
@@ -548,12 +740,13 @@ class LazyList(list):
             while not self._empty:
                 self._generate_more(1)
                 if list.__getitem__(self, -1) == object:
-                    return super().__len__() -1
+                    return list.__len__(self) - 1
         raise ValueError(f"{object} is not in LazyList")
 
     def insert(self, index: int, object):
-        if not self._empty and super().__len__() < index:
-            generate_n_more = index - super().__len__()
+        generated = list.__len__(self)
+        if not self._empty and generated < index:
+            generate_n_more = index - generated
             try:
                 self._generate_more(generate_n_more)
             except StopIteration:
@@ -596,10 +789,10 @@ class LazyList(list):
 
 
 class SearchableLazyList(LazyList, SearchableList):
+    # LazyList deletes through list.__delitem__ directly, which would leave the membership index stale
+    _indexed = False
+
     def __getitem__(self, item):
-        try:
-            if not isinstance(item, (int, slice)):
-                raise TypeError
+        if _is_index(item):
             return LazyList.__getitem__(self, item)
-        except TypeError:
-            return SearchableList.__getitem__(self, item)
+        return self.find(item)
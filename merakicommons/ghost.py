@@ -26,8 +26,6 @@ from abc import abstractmethod
 from typing import Callable, Union, Any
 import functools
 
-from merakicommons.cache import lazy_property
-
 
 class GhostLoadingRequiredError(Exception):
     pass
@@ -46,17 +44,26 @@ def ghost_load_on(*errors):
 
 
 class Ghost(object):
-    @lazy_property
-    def __load_groups(self) -> set:
+    @classmethod
+    def __class_load_groups(cls) -> frozenset:
+        # The load groups only depend on the class, so they're cached on the class itself rather than per instance.
+        # They're collected on first use instead of at class creation, so Ghost properties attached to the class afterwards still count.
+        try:
+            return cls.__dict__["_Ghost__load_groups"]
+        except KeyError:
+            pass
+
         load_groups = set()
-        for cls in self.__class__.__mro__:
-            if cls is Ghost:
+        for klass in cls.__mro__:
+            if klass is Ghost:
                 # We won't have any Ghost properties in the mro past Ghost
                 break
 
-            for attr in vars(cls).values():
+            for attr in vars(klass).values():
                 if isinstance(attr, Ghost.__property):
                     load_groups.add(attr.fget._Ghost__load_group)
+        load_groups = frozenset(load_groups)
+        cls.__load_groups = load_groups
         return load_groups
 
     @abstractmethod
@@ -93,12 +100,16 @@ class Ghost(object):
                 return self.fget(obj)
 
     def __set_loaded(self, load_group) -> None:
+        # The loaded groups are kept by name, so a pickled Ghost means the same thing in any process
         try:
-            self._Ghost__loaded_groups.add(load_group)
+            loaded_groups = self._Ghost__loaded_groups
         except AttributeError:
-            self._Ghost__loaded_groups = {load_group}
+            loaded_groups = self._Ghost__loaded_groups = set()
+        loaded_groups.add(load_group)
 
-        if self._Ghost__load_groups.issubset(self._Ghost__loaded_groups):
+        # The subset test can only pass once at least as many groups are loaded as the class has
+        load_groups = self._Ghost__class_load_groups()
+        if len(loaded_groups) >= len(load_groups) and load_groups <= loaded_groups:
             self._Ghost__all_loaded_status = True
 
     @staticmethod
@@ -1,52 +1,141 @@
-from typing import Callable
-from time import sleep, monotonic
-from math import ceil
+from typing import Callable, Optional
+from time import sleep, monotonic, monotonic_ns
 from abc import ABC, abstractmethod
-from threading import Lock, Timer, Thread
+from threading import Lock, Condition, Thread, local
+from heapq import heappush, heappop
+from itertools import count
+from random import randint
+import traceback
+import warnings
+import functools
+import inspect
+import sys
+import os
 
 
 class Semaphore(object):
-    """ This exists becuase the builtin Semaphore can't release multiple permits at once """
+    """ This exists becuase the builtin Semaphore can't release or drain multiple permits at once """
     def __init__(self, permits: int) -> None:
-        self._lock = Lock()
-        self._permits_lock = Lock()
+        self._condition = Condition(Lock())
         self._permits = permits
 
     def acquire(self, blocking: bool = True, timeout: int = -1) -> bool:
-        if not self._lock.acquire(blocking=blocking, timeout=timeout):
-            return False
-        with self._permits_lock:
+        with self._condition:
+            while self._permits < 1:
+                if not blocking:
+                    return False
+                if timeout < 0:
+                    self._condition.wait()
+                elif not self._condition.wait_for(lambda: self._permits >= 1, timeout):
+                    return False
             self._permits -= 1
-
-            if self._permits >= 1:
-                self._lock.release()
         return True
 
     def release(self, permits: int = 1) -> None:
-        with self._permits_lock:
-            current = self._permits
+        with self._condition:
             self._permits += permits
-            if current <= 0 and self._permits >= 1:
-                try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+            if self._permits >= 1:
+                self._condition.notify(self._permits)
 
     def drain(self, permits: int = -1) -> None:
-        with self._permits_lock:
-            acquired = self._lock.acquire(blocking=False)
+        with self._condition:
             if permits < 0:
                 self._permits = 0
             else:
                 self._permits = max(0, self._permits - permits)
-            if self._permits >= 1 and acquired:
-                self._lock.release()
+
+    def reset(self, permits: int) -> None:
+        """ Replaces the available permits in one step, the same as a full drain followed by releasing `permits` """
+        with self._condition:
+            self._permits = permits
+            if permits >= 1:
+                self._condition.notify(permits)
+
+
+MIN_TOKEN_UPDATE_FREQUENCY = 0.001
+
+
+class _ScheduledCall(object):
+    __slots__ = ("callback", "cancelled")
+
+    def __init__(self, callback: Callable[[], None]) -> None:
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class _Scheduler(object):
+    """ Runs callbacks after a delay on one shared thread, rather than starting a Timer thread for every call """
+    def __init__(self) -> None:
+        self._condition = Condition(Lock())
+        self._queue = []
+        self._sequence = count()  # Breaks ties between equal deadlines so calls are never compared
+        self._thread = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> _ScheduledCall:
+        call = _ScheduledCall(callback)
+        with self._condition:
+            heappush(self._queue, (monotonic() + delay, next(self._sequence), call))
+            if self._thread is None:
+                self._start()
+            else:
+                # The new call might be due before the one the thread is waiting on
+                self._condition.notify()
+        return call
+
+    def _start(self) -> None:
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        # Only the forking thread survives in a child process, so the scheduler thread is gone and its lock may be held by a thread that no longer exists.
+        # The queued calls are kept, since limiters in the child are still waiting on the resets they scheduled before the fork.
+        self._condition = Condition(Lock())
+        self._thread = None
+        if self._queue:
+            self._start()
+
+    def _run(self) -> None:
+        queue = self._queue
+        with self._condition:
+            while True:
+                if not queue:
+                    self._condition.wait()
+                    continue
+
+                deadline, _, call = queue[0]
+                remaining = deadline - monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                heappop(queue)
+                if call.cancelled:
+                    continue
+
+                # Don't hold the queue while the callback runs, it may schedule more calls
+                self._condition.release()
+                try:
+                    call.callback()
+                except Exception:
+                    # One failing callback shouldn't stop every other scheduled call
+                    traceback.print_exc()
+                finally:
+                    self._condition.acquire()
+
+
+_scheduler = _Scheduler()
+os.register_at_fork(after_in_child=_scheduler._after_fork)
 
 
 class RateLimiter(ABC):
     @property
     @abstractmethod
     def permits_issued(self) -> int:
+        # Limiters return their counter without taking their lock. Reading a single int is atomic, so readers never see a torn value.
         pass
 
     @abstractmethod
@@ -62,15 +151,48 @@ class RateLimiter(ABC):
         pass
 
     def limit(self, method: Callable) -> Callable:
-        def limited(*args, **kwargs):
-            with self:
-                return method(*args, **kwargs)
-        return limited
+        # Bind these once when decorating rather than going through the with statement's lookups on every call
+        enter = self.__enter__
+        exit = self.__exit__
+
+        try:
+            takes_arguments = bool(inspect.signature(method).parameters)
+        except (TypeError, ValueError):
+            # No signature available (e.g. some builtins), so assume it might take arguments
+            takes_arguments = True
+
+        if takes_arguments:
+            def limited(*args, **kwargs):
+                enter()
+                try:
+                    result = method(*args, **kwargs)
+                except BaseException:
+                    if not exit(*sys.exc_info()):
+                        raise
+                    return None
+                exit(None, None, None)
+                return result
+        else:
+            # Methods that take nothing don't need to pack and unpack empty arguments on every call
+            def limited():
+                enter()
+                try:
+                    result = method()
+                except BaseException:
+                    if not exit(*sys.exc_info()):
+                        raise
+                    return None
+                exit(None, None, None)
+                return result
+        return functools.wraps(method)(limited)
 
 
 class MultiRateLimiter(RateLimiter):
     def __init__(self, *limiters: RateLimiter) -> None:
         self._limiters = limiters
+        # The limiters are fixed, so bind their methods once instead of looking them up on every permit
+        self._enters = tuple(limiter.__enter__ for limiter in limiters)
+        self._exits = tuple(limiter.__exit__ for limiter in limiters)
 
         self._total_permits_issued = 0
         self._total_permits_issued_lock = Lock()
@@ -82,12 +204,20 @@ class MultiRateLimiter(RateLimiter):
         return len(self._limiters)
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        for limiter in self._limiters:
-            limiter.__exit__(exc_type, exc_val, exc_tb)
+        for exit in self._exits:
+            exit(exc_type, exc_val, exc_tb)
 
     def __enter__(self) -> "RateLimiter":
-        for limiter in self._limiters:
-            limiter.__enter__()
+        entered = 0
+        try:
+            for enter in self._enters:
+                enter()
+                entered += 1
+        except BaseException:
+            # If one limiter fails (e.g. times out), exit the ones already entered so they aren't left thinking a call is still in progress
+            for exit in reversed(self._exits[:entered]):
+                exit(None, None, None)
+            raise
 
         # Increment total count
         with self._total_permits_issued_lock:
@@ -97,8 +227,7 @@ class MultiRateLimiter(RateLimiter):
 
     @property
     def permits_issued(self) -> int:
-        with self._total_permits_issued_lock:
-            return self._total_permits_issued
+        return self._total_permits_issued
 
     def reset_permits_issued(self) -> None:
         with self._total_permits_issued_lock:
@@ -114,42 +243,41 @@ class FixedWindowRateLimiter(RateLimiter):
 
         self._permitter = Semaphore(self._window_permits)
 
-        self._total_permits_issued_lock = Lock()
+        # Guards both counters, so entering and exiting each take one lock for their bookkeeping
+        self._state_lock = Lock()
         self._total_permits_issued = 0
+        self._currently_processing = 0
 
         self._resetter_lock = Lock()
         self._resetter = None
 
-        self._currently_processing_lock = Lock()
-        self._currently_processing = 0
-
     def __enter__(self) -> "FixedWindowRateLimiter":
-        if not self._permitter.acquire(timeout=self._timeout):
+        if not self._acquire(blocking=True):
             raise TimeoutError("Rate Limiter timed out!")
-        with self._total_permits_issued_lock:
+        return self
+
+    def _acquire(self, blocking: bool) -> bool:
+        if not self._permitter.acquire(blocking=blocking, timeout=self._timeout):
+            return False
+        with self._state_lock:
             self._total_permits_issued += 1
-        with self._currently_processing_lock:
             self._currently_processing += 1
-        return self
+        return True
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        with self._currently_processing_lock:
+        with self._state_lock:
             self._currently_processing -= 1
 
         if not self._resetter:
             with self._resetter_lock:
                 if not self._resetter:
-                    self._resetter = Timer(self._window_seconds, self._reset)
-                    self._resetter.cancelled = False
-                    self._resetter.daemon = True
-                    self._resetter.start()
+                    self._resetter = _scheduler.schedule(self._window_seconds, self._reset)
 
     def _reset(self) -> None:
         with self._resetter_lock:
             if not self._resetter.cancelled:
-                self._permitter.drain()
-                with self._currently_processing_lock:
-                    self._permitter.release(self._window_permits - self._currently_processing)
+                with self._state_lock:
+                    self._permitter.reset(self._window_permits - self._currently_processing)
                 self._resetter = None
 
     def set_permits(self, permits: int) -> None:
@@ -167,28 +295,91 @@ class FixedWindowRateLimiter(RateLimiter):
 
             if self._resetter:
                 self._resetter.cancel()
-                self._resetter.cancelled = True
 
-            self._resetter = Timer(seconds, self._reset)
-            self._resetter.cancelled = False
-            self._resetter.daemon = True
-            self._resetter.start()
+            self._resetter = _scheduler.schedule(seconds, self._reset)
 
     @property
     def permits_issued(self) -> int:
-        with self._total_permits_issued_lock:
-            return self._total_permits_issued
+        return self._total_permits_issued
 
     def reset_permits_issued(self) -> None:
-        with self._total_permits_issued_lock:
+        with self._state_lock:
             self._total_permits_issued = 0
 
 
+class ShardedFixedWindowRateLimiter(RateLimiter):
+    """ A fixed window limiter split into independent shards so that many threads don't all contend on one limiter.
+    Each thread has a home shard it tries first. When that shard is out of permits, the thread borrows one from any other shard before waiting on its own. """
+    def __init__(self, window_seconds: int, window_permits: int, timeout: int = -1, shards: int = 8) -> None:
+        if shards < 1 or window_permits < shards:
+            raise ValueError("Shards must be >= 1 and <= window permits!")
+
+        # Spread the remainder over the first shards so the shards still add up to window_permits
+        permits, remainder = divmod(window_permits, shards)
+        self._shards = tuple(FixedWindowRateLimiter(window_seconds, permits + (1 if i < remainder else 0), timeout) for i in range(shards))
+
+        # Threads are handed shards round-robin the first time they use this limiter. Thread idents are pointer-aligned, so taking them modulo the shard count would put every thread on the same shard.
+        self._next_shard = count()
+        self._thread_shard = local()
+
+    def _shard(self) -> FixedWindowRateLimiter:
+        try:
+            return self._thread_shard.shard
+        except AttributeError:
+            shard = self._thread_shard.shard = self._shards[next(self._next_shard) % len(self._shards)]
+            # The shards this thread is inside, innermost last, so each exit goes back to the shard its permit came from
+            self._thread_shard.entered = []
+            return shard
+
+    def __getitem__(self, item):
+        return self._shards[item]
+
+    def __len__(self):
+        return len(self._shards)
+
+    def __enter__(self) -> "ShardedFixedWindowRateLimiter":
+        home = self._shard()
+        shard = home
+        if not home._acquire(blocking=False):
+            for shard in self._shards:
+                if shard is not home and shard._acquire(blocking=False):
+                    break
+            else:
+                shard = home
+                home.__enter__()
+        self._thread_shard.entered.append(shard)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._thread_shard.entered.pop().__exit__(exc_type, exc_val, exc_tb)
+
+    def set_permits(self, permits: int) -> None:
+        if permits < len(self._shards):
+            raise ValueError("Shards must be >= 1 and <= window permits!")
+        shard_permits, remainder = divmod(permits, len(self._shards))
+        for i, shard in enumerate(self._shards):
+            shard.set_permits(shard_permits + (1 if i < remainder else 0))
+
+    def restrict_for(self, seconds: int) -> None:
+        for shard in self._shards:
+            shard.restrict_for(seconds)
+
+    @property
+    def permits_issued(self) -> int:
+        # The shards are read one at a time, so this can be slightly stale while permits are being issued
+        return sum(shard.permits_issued for shard in self._shards)
+
+    def reset_permits_issued(self) -> None:
+        for shard in self._shards:
+            shard.reset_permits_issued()
+
+
 class TokenBucketRateLimiter(RateLimiter):
     def __init__(self, epoch_seconds: int, epoch_permits: int, max_burst: int, token_update_frequency: float, timeout: float = -1) -> None:
         if max_burst < 1 or max_burst > epoch_permits:
             raise ValueError("Max burst must be >= 1 and <= epoch permits!")
 
+        # Tokens are refilled continuously now, so the update frequency no longer changes the behavior. It's still validated so existing callers see the same errors.
         if token_update_frequency <= 0 or token_update_frequency > epoch_seconds:
             raise ValueError("Token update frequency must be > 0 and <= epoch seconds!")
 
@@ -197,80 +388,58 @@ class TokenBucketRateLimiter(RateLimiter):
 
         self._timeout = timeout
 
-        self._permitter = Lock()
-        self._token_limit = max_burst
-        self._tokens = max_burst
-
-        self._total_permits_issued = 0
-        self._total_permits_issued_lock = Lock()
+        # Tokens are counted in integer units where one token is the epoch length in nanoseconds and every elapsed nanosecond adds epoch_permits units.
+        # That keeps the refill rate exact, without float error building up as fractions of tokens are added and taken.
+        self._token_size = round(epoch_seconds * 1000000000)
+        self._token_limit = max_burst * self._token_size
+        self._tokens = self._token_limit
+        self._last_refill = monotonic_ns()
 
+        # Also guards the permit counter, so acquiring a permit takes a single lock
         self._enter_exit_lock = Lock()
-        self._token_update = token_update_frequency
-        self._token_provider = None
-
-    def __enter__(self) -> "TokenBucketRateLimiter":
-        # Grab the permit lock and decrement remaining permits. If this leaves it at 0, don't release the permit lock. It will be released by the token provider.
-        if not self._permitter.acquire(timeout=self._timeout):
-            raise TimeoutError("Rate Limiter timed out!")
-        with self._enter_exit_lock, self._total_permits_issued_lock:
-            self._tokens -= 1
-
-            self._total_permits_issued += 1
-
-            if self._tokens >= 1:
-                self._permitter.release()
-
-        return self
+        self._total_permits_issued = 0
 
-    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        # We don't want a thread sitting around dumping tokens into a filled bucket during downtimes. We construct one when needed and it cleans itself up if the bucket is full for an entire epoch.
+    def try_acquire(self) -> Optional[float]:
+        """ Takes a permit without blocking. Returns None if one was taken, otherwise the number of seconds until one will be available.
+        This lets callers do other work, or batch up several operations, instead of sleeping in __enter__. """
+        # Rather than having a thread drip tokens into the bucket, top it up from the time elapsed since the last refill whenever a permit is requested.
         with self._enter_exit_lock:
-            if not self._token_provider:
-                self._token_provider = Thread(target=self._provide_tokens)
-                self._token_provider.daemon = True
-                self._token_provider.start()
+            now = monotonic_ns()
+            self._tokens = min(self._tokens + (now - self._last_refill) * self._epoch_permits, self._token_limit)
+            self._last_refill = now
 
-    def _provide_tokens(self):
-        tokens_per_segment = self._epoch_permits / (self._epoch_seconds / self._token_update)
-        segments_full = 0
+            if self._tokens >= self._token_size:
+                self._tokens -= self._token_size
+                self._total_permits_issued += 1
+                return None
 
-        start_time = monotonic()
-        next_time = start_time + self._token_update
+            # The shortfall tells us exactly how long until the next token. Round up so we never wake before it's there.
+            return -(-(self._token_size - self._tokens) // self._epoch_permits) / 1000000000
 
-        # If we go an entire epoch with a full bucket we'll stop this provider
-        segments_per_epoch = int(ceil(self._epoch_seconds / self._token_update))
+    def __enter__(self) -> "TokenBucketRateLimiter":
+        deadline = None
         while True:
-            sleep(max(next_time - monotonic(), 0))
-            next_time = next_time + self._token_update
-
-            with self._enter_exit_lock:
-                if self._tokens == self._token_limit:
-                    segments_full += 1
-                elif self._tokens < 1:
-                    self._tokens = min(self._tokens + tokens_per_segment, self._token_limit)
-                    segments_full = 0
-                    if self._tokens >= 1:
-                        try:
-                            self._permitter.release()
-                        except RuntimeError:
-                            # Wasn't waiting on any acquire
-                            pass
-                else:
-                    self._tokens = min(self._tokens + tokens_per_segment, self._token_limit)
-                    segments_full = 0
+            wait = self.try_acquire()
+            if wait is None:
+                return self
+
+            if self._timeout >= 0:
+                now = monotonic()
+                if deadline is None:
+                    deadline = now + self._timeout
+                if now + wait > deadline:
+                    raise TimeoutError("Rate Limiter timed out!")
+            sleep(wait)
 
-                if segments_full >= segments_per_epoch:
-                    # End this thread
-                    self._token_provider = None
-                    break
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
 
     @property
     def permits_issued(self) -> int:
-        with self._total_permits_issued_lock:
-            return self._total_permits_issued
+        return self._total_permits_issued
 
     def reset_permits_issued(self) -> None:
-        with self._total_permits_issued_lock:
+        with self._enter_exit_lock:
             self._total_permits_issued = 0
 
 
@@ -282,6 +451,13 @@ class WindowedTokenBucketRateLimiter(RateLimiter):
         if token_update_frequency <= 0 or token_update_frequency > epoch_seconds:
             raise ValueError("Token update frequency must be > 0 and <= epoch seconds!")
 
+        # The provider thread wakes once per update, so a tiny frequency would have it spinning on a core
+        if epoch_seconds < MIN_TOKEN_UPDATE_FREQUENCY:
+            raise ValueError("Epoch seconds must be >= {}!".format(MIN_TOKEN_UPDATE_FREQUENCY))
+        if token_update_frequency < MIN_TOKEN_UPDATE_FREQUENCY:
+            warnings.warn("Token update frequency {} is below the minimum of {} seconds and will be raised to it.".format(token_update_frequency, MIN_TOKEN_UPDATE_FREQUENCY), stacklevel=2)
+            token_update_frequency = MIN_TOKEN_UPDATE_FREQUENCY
+
         self._epoch_seconds = epoch_seconds
         self._epoch_permits = epoch_permits
 
@@ -291,19 +467,18 @@ class WindowedTokenBucketRateLimiter(RateLimiter):
         self._token_limit = max_burst
         self._tokens = 1
 
-        self._total_permits_issued = 0
-        self._total_permits_issued_lock = Lock()
-
         self._enter_exit_lock = Lock()
+        self._total_permits_issued = 0
         self._currently_processing = 0
         self._token_update = token_update_frequency
+        self._token_update_ns = round(token_update_frequency * 1000000000)
         self._token_provider = None
 
     def __enter__(self) -> "WindowedTokenBucketRateLimiter":
         # Grab the permit lock and decrement remaining permits. If this leaves it at 0, don't release the permit lock. It will be released by the token provider.
         if not self._permitter.acquire(timeout=self._timeout):
             raise TimeoutError("Rate Limiter timed out!")
-        with self._enter_exit_lock, self._total_permits_issued_lock:
+        with self._enter_exit_lock:
             self._tokens -= 1
 
             self._total_permits_issued += 1
@@ -329,28 +504,42 @@ class WindowedTokenBucketRateLimiter(RateLimiter):
         segments = int((self._epoch_seconds - self._token_update) // self._token_update)
         tokens_per_segment = tokens_left / segments
 
-        start_time = monotonic()
-        next_time = start_time + self._token_update
+        # These don't change while the provider runs, so look them up once rather than every segment
+        # The schedule is kept in integer nanoseconds so it can't drift however many segments are added up
+        clock = monotonic_ns
+        wait = sleep
+        lock = self._enter_exit_lock
+        release = self._permitter.release
+        token_update = self._token_update_ns
+        token_limit = self._token_limit
+
+        # Spread each wake-up by up to 5% of a segment so providers for limiters created together don't all wake at once.
+        # The schedule itself isn't moved, so the jitter doesn't add up over the window.
+        jitter = token_update // 20
+        jitter_offset = randint
+
+        start_time = clock()
+        next_time = start_time + token_update
 
         for _ in range(segments):
-            sleep(max(next_time - monotonic(), 0))
-            next_time = next_time + self._token_update
+            wait(max(next_time - clock() + jitter_offset(-jitter, jitter), 0) / 1000000000)
+            next_time = next_time + token_update
 
-            with self._enter_exit_lock:
+            with lock:
                 if self._tokens < 1:
-                    self._tokens = min(self._tokens + tokens_per_segment, self._token_limit)
+                    self._tokens = min(self._tokens + tokens_per_segment, token_limit)
                     if self._tokens >= 1:
                         try:
-                            self._permitter.release()
+                            release()
                         except RuntimeError:
                             # Wasn't waiting on any acquire
                             pass
                 else:
-                    self._tokens = min(self._tokens + tokens_per_segment, self._token_limit)
+                    self._tokens = min(self._tokens + tokens_per_segment, token_limit)
 
         # Wait out the last segment and clean up
-        sleep(max(next_time - monotonic(), 0))
-        with self._enter_exit_lock:
+        wait(max(next_time - clock(), 0) / 1000000000)
+        with lock:
             if self._tokens < 1:
                 self._tokens = 1
                 self._permitter.release()
@@ -360,9 +549,8 @@ class WindowedTokenBucketRateLimiter(RateLimiter):
 
     @property
     def permits_issued(self) -> int:
-        with self._total_permits_issued_lock:
-            return self._total_permits_issued
+        return self._total_permits_issued
 
     def reset_permits_issued(self) -> None:
-        with self._total_permits_issued_lock:
+        with self._enter_exit_lock:
             self._total_permits_issued = 0
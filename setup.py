@@ -28,6 +28,7 @@ setup(
     ],
     license="MIT",
     packages=find_packages(),
+    python_requires=">=3.7",
     zip_safe=True,
     install_requires=[
     ],
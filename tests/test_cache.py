@@ -47,6 +47,113 @@ def test_lazy_property_loading():
         assert y.property_calls == 1
 
 
+def test_lazy_reset():
+    x = LazyProperty(TEST_VALUE_1)
+    wrapper = LazyProperty.property.fget
+
+    # Resetting before the first load is a no-op
+    wrapper._lazy_reset(x)
+    assert x.property == TEST_VALUE_1
+    assert x.property_calls == 1
+
+    wrapper._lazy_reset(x)
+    assert x.property == TEST_VALUE_1
+    assert x.property_calls == 2
+
+    wrapper._lazy_set(x, TEST_VALUE_2)
+    assert x.property == TEST_VALUE_2
+    assert x.property_calls == 2
+
+
+def test_lazy_property_slots():
+    class SlottedLazyProperty(object):
+        __slots__ = ("value", "_lazy__property")
+
+        def __init__(self, value) -> None:
+            self.value = value
+
+        @lazy_property
+        def property(self) -> str:
+            return self.value
+
+    x = SlottedLazyProperty(TEST_VALUE_1)
+    assert x.property == TEST_VALUE_1
+
+    wrapper = SlottedLazyProperty.property.fget
+    wrapper._lazy_reset(x)
+    wrapper._lazy_reset(x)
+    x.value = TEST_VALUE_2
+    assert x.property == TEST_VALUE_2
+
+
+def test_lazy_property_concurrent_loading():
+    from threading import Thread, Barrier
+    from time import sleep
+
+    class SlowLazyProperty(LazyProperty):
+        @lazy_property
+        def property(self) -> str:
+            sleep(0.01)
+            self.property_calls += 1
+            return self.value
+
+    x = SlowLazyProperty(TEST_VALUE_1)
+    barrier = Barrier(8)
+    results = []
+
+    def load():
+        barrier.wait()
+        results.append(x.property)
+
+    threads = [Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [TEST_VALUE_1] * 8
+    assert x.property_calls == 1
+
+
+def test_lazy_property_recursion():
+    from threading import Thread
+
+    class RecursiveLazyProperty(object):
+        @lazy_property
+        def property(self) -> str:
+            return self.property
+
+    errors = []
+
+    def load():
+        try:
+            RecursiveLazyProperty().property
+        except RecursionError as error:
+            errors.append(error)
+
+    thread = Thread(target=load, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
+def test_lazy_property_pickle():
+    import pickle
+    import copy
+
+    x = LazyProperty(TEST_VALUE_1)
+    x.property
+
+    y = pickle.loads(pickle.dumps(x))
+    assert y.property == TEST_VALUE_1
+    assert y.property_calls == 1
+
+    z = copy.deepcopy(x)
+    assert z.property == TEST_VALUE_1
+    assert z.property_calls == 1
+
+
 #########
 # Cache #
 #########
@@ -92,3 +199,106 @@ def test_cache_delete():
     assert not x.contains(str, 1)
     with pytest.raises(KeyError):
         x.get(str, 1)
+
+
+def test_cache_many_keys():
+    x = Cache()
+    for i in range(VALUE_COUNT):
+        x.put(int, i, str(i))
+    for i in range(VALUE_COUNT):
+        assert x.contains(int, i)
+        assert x.get(int, i) == str(i)
+    assert sorted(x.get_all(int), key=int) == [str(i) for i in range(VALUE_COUNT)]
+
+
+def test_cache_bad_shard_count():
+    with pytest.raises(ValueError):
+        Cache(shards=3)
+    with pytest.raises(ValueError):
+        Cache(shards=0)
+
+
+def test_cache_timeout():
+    from time import sleep
+
+    x = Cache()
+    x.put(int, "forever", 1)
+    x.put(int, "short", 2, timeout=0.05)
+    x.put(int, "never", 3, timeout=0)
+    assert not x.contains(int, "never")
+    assert x.get(int, "short") == 2
+    assert sorted(x.get_all(int)) == [1, 2]
+
+    sleep(0.1)
+    with pytest.raises(KeyError):
+        x.get(int, "short")
+    assert x.get(int, "forever") == 1
+    assert x.get_all(int) == [1]
+
+
+def test_cache_expire():
+    from time import sleep
+
+    x = Cache()
+    x.put(int, "forever", 1)
+    x.put(int, "short", 2, timeout=0.05)
+    x.put(str, "short", "2", timeout=0.05)
+
+    sleep(0.1)
+    x.expire(int)
+    assert x.contains(int, "forever")
+    assert not x.contains(int, "short")
+    assert x.contains(str, "short")
+
+    x.expire()
+    assert not x.contains(str, "short")
+    assert x.contains(int, "forever")
+
+
+def test_cache_missing_type():
+    x = Cache()
+    assert not x.contains(int, "test")
+    assert x.get_all(int) == []
+    with pytest.raises(KeyError):
+        x.get(int, "test")
+    with pytest.raises(KeyError):
+        x.delete(int, "test")
+    assert not x._data
+
+
+def test_cache_maxsize():
+    x = Cache()
+    for i in range(VALUE_COUNT):
+        x.put(int, i, i, maxsize=10)
+        assert x.get(int, 0) == 0  # Keep the first key recently used
+
+    assert len(x.get_all(int)) == 10
+    assert x.contains(int, 0)
+    assert not x.contains(int, 1)
+    for i in range(VALUE_COUNT - 9, VALUE_COUNT):
+        assert x.contains(int, i)
+
+    # The bound holds for the whole type, not per shard
+    x.put(float, 0, 0, maxsize=4)
+    for i in range(1, VALUE_COUNT):
+        x.put(float, i, i)
+    assert len(x.get_all(float)) == 4
+
+    # Keys that would share a shard don't evict each other before the bound is reached
+    for key in (0, 16, 32):
+        x.put(bytes, key, key, maxsize=20)
+    for key in (0, 16, 32):
+        assert x.contains(bytes, key)
+
+    # Other types aren't bounded
+    for i in range(VALUE_COUNT):
+        x.put(str, i, i)
+    assert len(x.get_all(str)) == VALUE_COUNT
+
+    # Bounding a type that already has entries trims it to the bound
+    x.put(str, VALUE_COUNT, VALUE_COUNT, maxsize=5)
+    assert len(x.get_all(str)) == 5
+    assert x.contains(str, VALUE_COUNT)
+
+    with pytest.raises(ValueError):
+        x.put(int, 0, 0, maxsize=0)
@@ -311,6 +311,45 @@ def test_list_delete():
     assert list_ == []
 
 
+def test_list_membership_after_mutation():
+    list_ = SearchableList([1, 2, 3, [4]])
+    assert 1 in list_
+    assert [4] in list_
+
+    list_.append(5)
+    list_.insert(0, 6)
+    assert 5 in list_
+    assert 6 in list_
+
+    list_.remove(1)
+    assert 1 not in list_
+    assert list_.pop() == 5
+    assert 5 not in list_
+
+    list_[0] = 7
+    assert 6 not in list_
+    assert 7 in list_
+
+    del list_[0]
+    assert 7 not in list_
+
+    list_.extend([8, 8])
+    list_ += [9]
+    assert 8 in list_
+    assert 9 in list_
+
+    del list_[-3:]
+    assert 8 not in list_
+    assert 9 not in list_
+
+    list_.__init__([10, 11])
+    assert 2 not in list_
+    assert 10 in list_
+
+    list_.clear()
+    assert 2 not in list_
+
+
 # Set #
 
 def test_simple_set_membership():
@@ -634,6 +673,39 @@ def test_dict_delete():
     assert dict_ == {}
 
 
+def test_dict_membership_after_mutation():
+    dict_ = SearchableDictionary({"a": 1, "b": [2]})
+    assert 1 in dict_
+    assert [2] in dict_
+
+    dict_["c"] = 3
+    assert 3 in dict_
+    dict_["c"] = 4
+    assert 3 not in dict_
+    assert 4 in dict_
+
+    del dict_["a"]
+    assert 1 not in dict_
+    assert dict_.pop("c") == 4
+    assert 4 not in dict_
+    assert "c" not in dict_
+
+    dict_.update({"d": 5})
+    dict_.setdefault("e", 6)
+    assert 5 in dict_
+    assert 6 in dict_
+
+    dict_.delete(5)
+    assert 5 not in dict_
+    assert "d" not in dict_
+
+    dict_ = SearchableDictionary({"a": 1})
+    assert 1 in dict_
+    dict_.__init__({"a": 2})
+    assert 1 not in dict_
+    assert 2 in dict_
+
+
 def test_lazy_list():
     ll = LazyList(generator=(i for i in range(10)), known_data=None)
     assert ll[0] == 0
@@ -645,6 +717,30 @@ def test_lazy_list():
     assert len(ll) == 10
 
 
+def test_lazy_list_slice():
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    ll[2]
+    assert list(ll[0:8]) == [0, 1, 2, 3, 4, 5, 6, 7]
+
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    assert list(ll[3:20]) == [3, 4, 5, 6, 7, 8, 9]
+
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    ll[4]
+    assert list(ll[1:9:3]) == [1, 4, 7]
+    assert list(ll[-3:]) == [7, 8, 9]
+
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    assert list(ll[::-1]) == [9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    assert list(ll[5:0:-1]) == [5, 4, 3, 2, 1]
+
+    ll = LazyList(generator=(i for i in range(10)), known_data=None)
+    ll[2]
+    assert list(ll[:-7]) == [0, 1, 2]
+
+
 def test_lazy_list_contains():
     ll = LazyList(generator=(i for i in range(10)), known_data=None)
     assert 5 in ll
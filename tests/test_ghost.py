@@ -3,6 +3,7 @@ import pytest
 from merakicommons.ghost import Ghost, GhostLoadingRequiredError
 
 TEST_VALUE = "TEST VALUE"
+TEST_VALUE_TYPE = type(TEST_VALUE)
 VALUE_COUNT = 100
 
 
@@ -43,7 +44,7 @@ def test_ghost_property():
     x = GhostObject()
     for _ in range(VALUE_COUNT):
         value = x.value
-        assert type(value) is type(TEST_VALUE)
+        assert type(value) is TEST_VALUE_TYPE
         assert value == TEST_VALUE
         assert x.last_loaded == "value"
 
@@ -52,7 +53,7 @@ def test_constant_value():
     x = GhostObject()
     for _ in range(VALUE_COUNT):
         value = x.constant_value
-        assert type(value) is type(TEST_VALUE)
+        assert type(value) is TEST_VALUE_TYPE
         assert value == TEST_VALUE
         assert x.last_loaded is None
 
@@ -109,3 +110,132 @@ def test_ghost_load_bad_value():
             x.bad_value
         assert x.load_calls == 0
         assert x.last_loaded is None
+
+
+def test_ghost_all_loaded():
+    class GroupedGhost(GhostObject):
+        @Ghost.property("other")
+        def other_value(self) -> str:
+            try:
+                return self._other_value
+            except AttributeError:
+                raise GhostLoadingRequiredError
+
+        def __load__(self, load_group) -> None:
+            if load_group == "other":
+                self.load_calls += 1
+                self._other_value = TEST_VALUE
+                self.last_loaded = load_group
+            else:
+                super().__load__(load_group)
+
+    assert GroupedGhost._Ghost__class_load_groups() == {"value", "constant_value", "bad_value", "other"}
+
+    x = GroupedGhost()
+    assert not x._Ghost__all_loaded
+    for _ in range(VALUE_COUNT):
+        x.value
+        assert not x._Ghost__all_loaded
+
+    assert x._Ghost__is_loaded("value")
+    assert not x._Ghost__is_loaded("other")
+    assert not x._Ghost__is_loaded("never used")
+
+    x._Ghost__set_loaded("constant_value")
+    x._Ghost__set_loaded("bad_value")
+    assert not x._Ghost__all_loaded
+
+    x.other_value
+    assert x.load_calls == 2
+    assert x._Ghost__all_loaded
+
+
+def test_ghost_property_added_later():
+    class LateGhost(GhostObject):
+        pass
+
+    def other_value(self) -> str:
+        try:
+            return self._other_value
+        except AttributeError:
+            raise GhostLoadingRequiredError
+
+    # Properties attached after the class is created still count towards being fully loaded
+    LateGhost.other_value = Ghost.property("other")(other_value)
+
+    x = LateGhost()
+    x.value
+    x._Ghost__set_loaded("constant_value")
+    x._Ghost__set_loaded("bad_value")
+    assert not x._Ghost__all_loaded
+    x._Ghost__set_loaded("other")
+    assert x._Ghost__all_loaded
+
+
+def test_ghost_pickle():
+    import pickle
+
+    x = GhostObject()
+    x.value
+    y = pickle.loads(pickle.dumps(x))
+    assert y._Ghost__is_loaded("value")
+    assert not y._Ghost__is_loaded("constant_value")
+    assert not y._Ghost__all_loaded
+    assert y.value == TEST_VALUE
+    assert y.load_calls == 1
+
+
+def test_ghost_mixin():
+    class Slotted(object):
+        __slots__ = ("_other",)
+
+    # Ghost has no instance layout of its own, so it mixes with builtins and slotted classes
+    class DictGhost(dict, Ghost):
+        def __load__(self, load_group) -> None:
+            self["value"] = TEST_VALUE
+
+        @Ghost.property
+        def value(self) -> str:
+            try:
+                return self["value"]
+            except KeyError:
+                raise GhostLoadingRequiredError
+
+    class SlottedMixinGhost(Slotted, Ghost):
+        def __load__(self, load_group) -> None:
+            self._other = TEST_VALUE
+
+        @Ghost.property
+        def value(self) -> str:
+            try:
+                return self._other
+            except AttributeError:
+                raise GhostLoadingRequiredError
+
+    x = DictGhost()
+    assert not x._Ghost__all_loaded
+    assert x.value == TEST_VALUE
+    assert x == {"value": TEST_VALUE}
+    assert x._Ghost__all_loaded
+
+    y = SlottedMixinGhost()
+    assert y.value == TEST_VALUE
+    assert y._Ghost__all_loaded
+
+    # A subclass declaring its own slots still gets the __dict__ Ghost's bookkeeping lives in
+    class SlottedGhost(Ghost):
+        __slots__ = ("_value",)
+
+        def __load__(self, load_group) -> None:
+            self._value = TEST_VALUE
+
+        @Ghost.property
+        def value(self) -> str:
+            try:
+                return self._value
+            except AttributeError:
+                raise GhostLoadingRequiredError
+
+    z = SlottedGhost()
+    assert z.value == TEST_VALUE
+    assert z._Ghost__all_loaded
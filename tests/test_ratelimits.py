@@ -1,4 +1,4 @@
-from merakicommons.ratelimits import FixedWindowRateLimiter, TokenBucketRateLimiter, WindowedTokenBucketRateLimiter
+from merakicommons.ratelimits import MultiRateLimiter, FixedWindowRateLimiter, ShardedFixedWindowRateLimiter, TokenBucketRateLimiter, WindowedTokenBucketRateLimiter
 
 SECONDS = 1
 PERMITS = 6
@@ -33,6 +33,21 @@ def test_window_decorator_simple():
     assert call()
 
 
+def test_window_decorator_arguments():
+    limiter = FixedWindowRateLimiter(SECONDS, PERMITS)
+
+    @limiter.limit
+    def add(x, y=1):
+        """Adds two numbers."""
+        return x + y
+
+    assert add(1) == 2
+    assert add(1, y=2) == 3
+    assert add.__name__ == "add"
+    assert add.__doc__ == "Adds two numbers."
+    assert limiter.permits_issued == 2
+
+
 def test_window_permit_count():
     limiter = FixedWindowRateLimiter(SECONDS, MANY_PERMITS)
     assert limiter.permits_issued == 0
@@ -41,29 +56,33 @@ def test_window_permit_count():
     def call():
         pass
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         with limiter:
             pass
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
     limiter.reset_permits_issued()
     assert limiter.permits_issued == 0
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         call()
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
 
 def test_window_acquire_timing():
     from time import monotonic
 
     limiter = FixedWindowRateLimiter(SECONDS, PERMITS)
-    times = []
-    for _ in range(VALUE_COUNT):
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
         with limiter:
-            times.append(monotonic())
+            times[i] = monotonic()
 
-    start_indexes = [i for i in range(VALUE_COUNT) if i % PERMITS == 0]
+    start_indexes = range(0, VALUE_COUNT, PERMITS)
 
     last = -SECONDS
     for index in start_indexes:
@@ -80,11 +99,11 @@ def test_window_decorator_timing():
     def call():
         return monotonic()
 
-    times = []
-    for _ in range(VALUE_COUNT):
-        times.append(call())
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
+        times[i] = call()
 
-    start_indexes = [i for i in range(VALUE_COUNT) if i % PERMITS == 0]
+    start_indexes = range(0, VALUE_COUNT, PERMITS)
 
     last = -SECONDS
     for index in start_indexes:
@@ -125,6 +144,135 @@ def test_window_decorator_across_windows():
 
     assert (SECONDS - EPSILON) * 3 >= second - first >= (SECONDS - EPSILON) * 2
 
+
+def test_window_restrict_for():
+    from time import monotonic
+
+    limiter = FixedWindowRateLimiter(SECONDS, PERMITS)
+
+    with limiter:
+        pass
+
+    # Restricting replaces the pending window reset, so no permits are available until the restriction ends
+    start = monotonic()
+    limiter.restrict_for(SECONDS / 2)
+    with limiter:
+        end = monotonic()
+
+    assert SECONDS - EPSILON >= end - start >= SECONDS / 2 - EPSILON
+
+
+def test_window_timeout():
+    import pytest
+
+    limiter = FixedWindowRateLimiter(SECONDS, 1, timeout=SECONDS / 4)
+
+    with limiter:
+        pass
+
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+
+
+def test_window_after_fork():
+    import os
+
+    limiter = FixedWindowRateLimiter(SECONDS / 4, 1, timeout=SECONDS)
+
+    # The parent starts the scheduler thread, which a forked child doesn't inherit
+    with limiter:
+        pass
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with limiter:
+                pass
+            with limiter:
+                pass
+        except BaseException:
+            os._exit(1)
+        os._exit(0)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status)
+    assert os.WEXITSTATUS(status) == 0
+
+#################################
+# ShardedFixedWindowRateLimiter #
+#################################
+
+
+def test_sharded_window_bad_shards():
+    import pytest
+
+    with pytest.raises(ValueError):
+        ShardedFixedWindowRateLimiter(SECONDS, PERMITS, shards=0)
+
+    with pytest.raises(ValueError):
+        ShardedFixedWindowRateLimiter(SECONDS, PERMITS, shards=PERMITS + 1)
+
+
+def test_sharded_window_permit_split():
+    limiter = ShardedFixedWindowRateLimiter(SECONDS, 7, shards=3)
+    assert len(limiter) == 3
+    assert [shard._window_permits for shard in limiter] == [3, 2, 2]
+
+
+def test_sharded_window_permit_count():
+    from threading import Thread
+
+    limiter = ShardedFixedWindowRateLimiter(SECONDS, MANY_PERMITS, shards=4)
+
+    @limiter.limit
+    def call():
+        pass
+
+    def work():
+        for _ in range(VALUE_COUNT):
+            call()
+
+    threads = [Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each thread got its own shard
+    assert limiter.permits_issued == 4 * VALUE_COUNT
+    assert [shard.permits_issued for shard in limiter] == [VALUE_COUNT] * 4
+
+    limiter.reset_permits_issued()
+    assert limiter.permits_issued == 0
+
+
+def test_sharded_window_acquire_timing():
+    from time import monotonic
+
+    limiter = ShardedFixedWindowRateLimiter(SECONDS, PERMITS, shards=2)
+
+    # A single thread borrows from the other shard once its own runs out, so it still gets the full window
+    times = [0.0] * (PERMITS + 1)
+    for i in range(PERMITS + 1):
+        with limiter:
+            times[i] = monotonic()
+
+    assert times[PERMITS - 1] - times[0] < SECONDS / 2
+    assert times[PERMITS] - times[0] >= SECONDS - EPSILON
+    assert [shard.permits_issued for shard in limiter] == [PERMITS // 2 + 1, PERMITS // 2]
+
+
+def test_sharded_window_nested_exit():
+    limiter = ShardedFixedWindowRateLimiter(SECONDS, 2, shards=2)
+
+    # The inner permit is borrowed from the other shard, and each exit has to go back to the shard it entered
+    with limiter:
+        with limiter:
+            assert [shard._currently_processing for shard in limiter] == [1, 1]
+        assert [shard._currently_processing for shard in limiter] == [1, 0]
+    assert [shard._currently_processing for shard in limiter] == [0, 0]
+
 ##########################
 # TokenBucketRateLimiter #
 ##########################
@@ -156,27 +304,31 @@ def test_bucket_permit_count():
     def call():
         pass
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         with limiter:
             pass
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
     limiter.reset_permits_issued()
     assert limiter.permits_issued == 0
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         call()
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
 
 def test_bucket_acquire_timing():
     from time import monotonic
 
     limiter = TokenBucketRateLimiter(SECONDS, PERMITS, BURST, TOKENS)
-    times = []
-    for _ in range(VALUE_COUNT):
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
         with limiter:
-            times.append(monotonic())
+            times[i] = monotonic()
 
     frequency = SECONDS / PERMITS
 
@@ -205,9 +357,9 @@ def test_bucket_decorator_timing():
     def call():
         return monotonic()
 
-    times = []
-    for _ in range(VALUE_COUNT):
-        times.append(call())
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
+        times[i] = call()
 
     frequency = SECONDS / PERMITS
 
@@ -227,6 +379,41 @@ def test_bucket_decorator_timing():
         assert expected_times[i] - epsilon <= time <= expected_times[i] + epsilon
 
 
+def test_bucket_timeout():
+    import pytest
+
+    limiter = TokenBucketRateLimiter(SECONDS, PERMITS, 1, TOKENS, timeout=TOKENS / 4)
+
+    with limiter:
+        pass
+
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+
+    # A timeout long enough to cover the refill should wait for it instead
+    limiter = TokenBucketRateLimiter(SECONDS, PERMITS, 1, TOKENS, timeout=TOKENS * 2)
+
+    with limiter:
+        pass
+
+    with limiter:
+        pass
+
+
+def test_bucket_try_acquire():
+    limiter = TokenBucketRateLimiter(SECONDS, PERMITS, BURST, TOKENS)
+
+    for _ in range(BURST):
+        assert limiter.try_acquire() is None
+    assert limiter.permits_issued == BURST
+
+    # The bucket is empty, so we're told how long until the next token instead of waiting for it
+    wait = limiter.try_acquire()
+    assert 0 < wait <= SECONDS / PERMITS
+    assert limiter.permits_issued == BURST
+
+
 ##################################
 # WindowedTokenBucketRateLimiter #
 ##################################
@@ -257,27 +444,31 @@ def test_windowed_bucket_permit_count():
     def call():
         pass
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         with limiter:
             pass
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
     limiter.reset_permits_issued()
     assert limiter.permits_issued == 0
 
-    for i in range(LARGE_VALUE_COUNT // 2):
+    issued = []
+    for _ in range(LARGE_VALUE_COUNT // 2):
         call()
-        assert limiter.permits_issued == i + 1
+        issued.append(limiter.permits_issued)
+    assert issued == list(range(1, LARGE_VALUE_COUNT // 2 + 1))
 
 
 def test_windowed_bucket_acquire_timing():
     from time import monotonic
 
     limiter = WindowedTokenBucketRateLimiter(SECONDS, PERMITS, BURST, TOKENS)
-    times = []
-    for _ in range(VALUE_COUNT):
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
         with limiter:
-            times.append(monotonic())
+            times[i] = monotonic()
 
     frequency = SECONDS / PERMITS
 
@@ -300,9 +491,9 @@ def test_windowed_bucket_decorator_timing():
     def call():
         return monotonic()
 
-    times = []
-    for _ in range(VALUE_COUNT):
-        times.append(call())
+    times = [0.0] * VALUE_COUNT
+    for i in range(VALUE_COUNT):
+        times[i] = call()
 
     frequency = SECONDS / PERMITS
 
@@ -314,3 +505,57 @@ def test_windowed_bucket_decorator_timing():
     epsilon = 0.04
     for i, time in enumerate(times):
         assert expected_times[i] - epsilon <= time <= expected_times[i] + epsilon
+
+
+def test_windowed_bucket_minimum_update_frequency():
+    import pytest
+
+    with pytest.warns(UserWarning) as record:
+        limiter = WindowedTokenBucketRateLimiter(SECONDS, PERMITS, BURST, 0.000001)
+    # The warning points at the caller rather than at the limiter's own code
+    assert record[0].filename == __file__
+
+    with limiter:
+        pass
+
+    # An epoch shorter than the minimum update frequency can't be split into updates
+    with pytest.raises(ValueError):
+        WindowedTokenBucketRateLimiter(0.0005, PERMITS, BURST, 0.0001)
+
+####################
+# MultiRateLimiter #
+####################
+
+
+def test_multi_acquire_simple():
+    first = FixedWindowRateLimiter(SECONDS, PERMITS)
+    second = TokenBucketRateLimiter(SECONDS, PERMITS, BURST, TOKENS)
+    limiter = MultiRateLimiter(first, second)
+
+    x = False
+    with limiter:
+        x = True
+    assert x
+
+    assert limiter.permits_issued == 1
+    assert first.permits_issued == 1
+    assert second.permits_issued == 1
+
+
+def test_multi_enter_failure():
+    import pytest
+
+    first = FixedWindowRateLimiter(SECONDS, PERMITS)
+    second = FixedWindowRateLimiter(SECONDS, 1, timeout=SECONDS / 4)
+    limiter = MultiRateLimiter(first, second)
+
+    with second:
+        pass
+
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+
+    # The first limiter was exited again, so its next window won't be short a permit
+    assert first._currently_processing == 0
+    assert limiter.permits_issued == 0